@@ -1,26 +1,45 @@
 import streamlit as st
-import PyPDF2
-import pdf2image
-from PIL import Image
+import pypdfium2 as pdfium
 import pytesseract
-import plotly.graph_objects as go
-import plotly.express as px
 import pandas as pd
 import json
 import os
 import platform
 from dotenv import load_dotenv
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+from collections import Counter
+import threading
+import queue
+import tempfile
+import hashlib
+
+# Optional fast JSON library; the standard json module is used when unavailable
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional in-process Tesseract bindings; pytesseract is used when unavailable
+try:
+    from tesserocr import PyTessBaseAPI, PSM
+except ImportError:
+    PyTessBaseAPI = None
 
 # Load environment variables
 load_dotenv()
 
 # Windows Configuration
+@st.cache_resource
 def setup_windows_paths():
-    """Configure paths for Windows"""
+    """Configure paths for Windows once per process; Streamlit reruns reuse the result"""
     if platform.system() == "Windows":
         # Tesseract paths
         tesseract_paths = [
@@ -37,24 +56,356 @@ def setup_windows_paths():
                 break
         else:
             st.error("Tesseract not found. Please install Tesseract OCR from: https://github.com/UB-Mannheim/tesseract/wiki")
-        
-        # Poppler paths
-        poppler_paths = [
-            r'C:\poppler\Library\bin',
-            r'C:\Program Files\poppler\Library\bin',
-            r'C:\Program Files (x86)\poppler\Library\bin'
-        ]
-        
-        current_path = os.environ.get('PATH', '')
-        for path in poppler_paths:
-            if os.path.exists(path) and path not in current_path:
-                os.environ['PATH'] = path + os.pathsep + current_path
-                print(f"Added Poppler to PATH: {path}")
-                break
 
 # Initialize paths
 setup_windows_paths()
 
+# OpenRouter configuration
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+MODEL_NAME = os.getenv("MODEL_NAME", "meta-llama/llama-3.1-8b-instruct")
+MAX_CONCURRENT_REQUESTS = 4  # Keep parallel chunk requests within OpenRouter rate limits
+MAX_RETRIES = 3  # Retries after the first attempt for rate limits, 5xx errors and connection failures
+OPENROUTER_TIMEOUT = (5, 120)  # (connect, read) seconds; long completions can take well over 30s
+STREAM_RENDER_INTERVAL = 0.2  # Seconds between redraws of a streaming response
+
+# Parallel OCR workers; each Tesseract process already uses several threads
+OCR_MAX_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+
+def json_loads(data: str) -> Any:
+    """Parse JSON, using orjson when installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def parse_model_json(text: str) -> Any:
+    """Parse a model reply as JSON, ignoring any code fence or prose around the outermost object"""
+    # Providers that ignore JSON mode may still wrap the object; slicing is linear, unlike a greedy regex
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    return json_loads(text)
+
+def json_dumps_pretty(data: Any) -> bytes:
+    """Serialize JSON to UTF-8 bytes with 2-space indentation, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+# Render resolution for OCR; 200 DPI grayscale is enough for typical report scans
+DEFAULT_OCR_DPI = 200
+
+def format_markdown_cell(value: Any) -> str:
+    """Format an extracted value for a markdown table cell"""
+    if isinstance(value, list):
+        text = " ".join(f"• {item}" for item in value) if value else "*No items*"
+    elif isinstance(value, dict):
+        text = "; ".join(f"{key.replace('_', ' ').title()}: {item}" for key, item in value.items())
+    elif str(value) == "N/A":
+        text = "*Not Available*"
+    else:
+        text = str(value)
+    # Pipes and line breaks would end the cell or the table row
+    return text.replace("|", "\\|").replace("\n", " ")
+
+def is_populated(value: Any) -> bool:
+    """Check whether an extracted value holds data rather than being empty or N/A"""
+    return bool(value) and value != "N/A"
+
+def dedupe_items(items: Iterable[Any]) -> List[Any]:
+    """Remove duplicate list entries, comparing dicts by content and keeping first-seen order"""
+    unique_items = {}
+    for item in items:
+        unique_items.setdefault(json.dumps(item, sort_keys=True, default=str), item)
+    return list(unique_items.values())
+
+# Result sections merged across chunks: lists are concatenated, dicts take the first populated value
+LIST_FIELDS = (
+    "lab_results", "medications", "procedures", "diagnoses", "imaging_studies",
+    "appointments_schedule", "doctor_recommendations", "discharge_instructions",
+    "key_findings", "risk_factors", "allergies", "medical_history", "family_history"
+)
+DICT_FIELDS = (
+    "administrative_info", "patient_info", "visit_details", "medical_staff",
+    "vital_signs", "social_history", "billing_info", "chart_data"
+)
+CONFIDENCE_LEVELS = {"high": 3, "medium": 2, "low": 1}
+# Rows shown for long list tables until the user chooses to see all of them
+TABLE_PREVIEW_ROWS = 50
+# Sections of the metadata view, in display order
+SECTION_DOCUMENT = "📋 Document Metadata"
+SECTION_ADMINISTRATIVE = "🏥 Administrative Data"
+SECTION_PATIENT = "👤 Patient Information"
+SECTION_MEDICAL = "🩺 Medical Data"
+SECTION_BILLING = "💰 Billing"
+SECTION_RAW = "🔍 Raw Data Structure"
+METADATA_SECTIONS = (
+    SECTION_DOCUMENT,
+    SECTION_ADMINISTRATIVE,
+    SECTION_PATIENT,
+    SECTION_MEDICAL,
+    SECTION_BILLING,
+    SECTION_RAW
+)
+# Item counts reported in the metadata summary: (statistic, field)
+SUMMARY_COUNT_FIELDS = (
+    ("medications_count", "medications"),
+    ("lab_results_count", "lab_results"),
+    ("procedures_count", "procedures"),
+    ("diagnoses_count", "diagnoses"),
+    ("imaging_studies_count", "imaging_studies"),
+    ("appointments_count", "appointments_schedule"),
+    ("risk_factors_count", "risk_factors"),
+    ("allergies_count", "allergies"),
+    ("recommendations_count", "doctor_recommendations"),
+    ("discharge_instructions_count", "discharge_instructions")
+)
+# Dict sections averaged into the overall completeness; billing_info is also reported on its own
+COMPLETENESS_FIELDS = ("billing_info", "vital_signs", "patient_info", "administrative_info", "visit_details")
+# Plain string lists rendered as single-column tables: (field, title, icon)
+SIMPLE_LIST_SECTIONS = (
+    ("doctor_recommendations", "Doctor Recommendations", "👨‍⚕️"),
+    ("discharge_instructions", "Discharge Instructions", "🏠"),
+    ("key_findings", "Key Findings", "🔍"),
+    ("risk_factors", "Risk Factors", "⚠️")
+)
+
+# Static extraction instructions, sent as the system message so every request shares the same
+# cacheable prefix. Fields are listed in prose instead of an N/A-filled JSON skeleton to save
+# input tokens; omitted fields are restored from DEFAULT_REPORT after parsing.
+SYSTEM_PROMPT = """
+Analyze the medical document chunk provided by the user and extract ALL available information as a single valid JSON object.
+Use only the keys below and omit any key or field that is not found in the chunk.
+
+- document_metadata: analysis_confidence ("high", "medium" or "low")
+- administrative_info: bill_number, mr_number, room_ward_number, hospital_name, hospital_address, hospital_phone, department, admission_number
+- patient_info: name, age, gender, date_of_birth, address, phone_number, emergency_contact, insurance_info, patient_id
+- visit_details: date_of_visit, admission_date, discharge_date, visit_type, chief_complaint, referring_physician
+- medical_staff: attending_physician, consultant_name, resident_doctor, nurse_in_charge, other_staff (list)
+- vital_signs: blood_pressure_systolic, blood_pressure_diastolic, heart_rate, temperature, respiratory_rate, oxygen_saturation, weight, height, bmi, pain_scale
+- social_history: smoking, alcohol, occupation, exercise
+- billing_info: total_charges, insurance_coverage, patient_responsibility, payment_status
+- chart_data: trend_analysis, comparison_data, time_series (lists of numerical data points)
+- follow_up_required
+- Lists of objects: lab_results, medications, procedures, diagnoses, imaging_studies, appointments_schedule
+- Lists of strings: doctor_recommendations, discharge_instructions, key_findings, risk_factors, allergies, medical_history, family_history
+
+Extract ALL numerical values for charts. Respond with the JSON object only.
+"""
+# Part of the analysis cache key so cached results are invalidated whenever the prompt is edited
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:16]
+
+# Complete report structure; anything the model leaves out is reported as "N/A" or empty
+DEFAULT_REPORT = {
+    "document_metadata": {
+        "extraction_date": "N/A",
+        "document_type": "medical_report",
+        "file_source": "uploaded_pdf",
+        "analysis_confidence": "N/A",
+        "text_length": 0,
+        "extraction_method": "AI_analysis"
+    },
+    "administrative_info": dict.fromkeys((
+        "bill_number", "mr_number", "room_ward_number", "hospital_name",
+        "hospital_address", "hospital_phone", "department", "admission_number"
+    ), "N/A"),
+    "patient_info": dict.fromkeys((
+        "name", "age", "gender", "date_of_birth", "address", "phone_number",
+        "emergency_contact", "insurance_info", "patient_id"
+    ), "N/A"),
+    "visit_details": dict.fromkeys((
+        "date_of_visit", "admission_date", "discharge_date", "visit_type",
+        "chief_complaint", "referring_physician"
+    ), "N/A"),
+    "medical_staff": {
+        **dict.fromkeys(("attending_physician", "consultant_name", "resident_doctor", "nurse_in_charge"), "N/A"),
+        "other_staff": []
+    },
+    "vital_signs": dict.fromkeys((
+        "blood_pressure_systolic", "blood_pressure_diastolic", "heart_rate", "temperature",
+        "respiratory_rate", "oxygen_saturation", "weight", "height", "bmi", "pain_scale"
+    ), "N/A"),
+    **{field: [] for field in LIST_FIELDS},
+    "social_history": dict.fromkeys(("smoking", "alcohol", "occupation", "exercise"), "N/A"),
+    "follow_up_required": "N/A",
+    "billing_info": dict.fromkeys((
+        "total_charges", "insurance_coverage", "patient_responsibility", "payment_status"
+    ), "N/A"),
+    "chart_data": {
+        "trend_analysis": [],
+        "comparison_data": [],
+        "time_series": []
+    }
+}
+
+def fill_defaults(data: Any, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """Recursively add missing keys from defaults, keeping any extra keys the model returned.
+    Values that should be lists or objects but are not (e.g. "medications": "N/A") are replaced
+    by the default, so later merging never iterates over a string's characters"""
+    data = data if isinstance(data, dict) else {}
+    filled = dict(data)
+    for key, default in defaults.items():
+        if isinstance(default, dict):
+            filled[key] = fill_defaults(data.get(key), default)
+        elif isinstance(default, list):
+            if not isinstance(data.get(key), list):
+                filled[key] = list(default)
+        elif key not in data:
+            filled[key] = default
+    return filled
+
+# Pages with fewer alphanumeric characters than this in their text layer are OCR'd
+MIN_PAGE_TEXT_CHARS = 50
+
+# Extracted pages are joined with a form feed so page headers/footers can be told apart from body text
+PAGE_BREAK = "\n\f\n"
+# A line at least this long in the first or last few lines of most pages (and of at least
+# BOILERPLATE_MIN_PAGES pages) is a page header/footer; only its first copy is sent
+BOILERPLATE_MIN_LINE_CHARS = 20
+BOILERPLATE_EDGE_LINES = 3
+BOILERPLATE_MIN_PAGES = 3
+_HORIZONTAL_WHITESPACE = re.compile(r"[ \t\v]+")
+_EXTRA_BLANK_LINES = re.compile(r"\n{3,}")
+
+def _page_edge_indices(lines: List[str]) -> set:
+    """Indices of the first and last BOILERPLATE_EDGE_LINES non-empty lines of a page"""
+    content = [i for i, line in enumerate(lines) if line]
+    return set(content[:BOILERPLATE_EDGE_LINES] + content[-BOILERPLATE_EDGE_LINES:])
+
+def prefilter_text(text: str) -> str:
+    """Shrink extracted text before analysis by collapsing spaces and dropping repeated page header/footer lines"""
+    pages = [
+        [_HORIZONTAL_WHITESPACE.sub(" ", line).strip() for line in page.split("\n")]
+        for page in text.split("\f")
+    ]
+    # Count each line once per page and only where headers/footers sit, so repeated body text
+    # (shared dosing instructions, "Within normal limits" in lab tables) is never dropped
+    page_counts = Counter(
+        line for lines in pages for line in {lines[i] for i in _page_edge_indices(lines)}
+        if len(line) >= BOILERPLATE_MIN_LINE_CHARS
+    )
+    min_pages = max(BOILERPLATE_MIN_PAGES, len(pages) // 2 + 1)
+    boilerplate = {line for line, count in page_counts.items() if count >= min_pages}
+    
+    seen = set()
+    kept_pages = []
+    for lines in pages:
+        edge_indices = _page_edge_indices(lines)
+        kept = []
+        for i, line in enumerate(lines):
+            if i in edge_indices and line in boilerplate:
+                if line in seen:
+                    continue
+                seen.add(line)
+            kept.append(line)
+        kept_pages.append("\n".join(kept))
+    # Paragraph breaks are kept because the chunker splits on them
+    return _EXTRA_BLANK_LINES.sub("\n\n", "\n\n".join(kept_pages)).strip()
+
+def chunk_text(text: str, max_chars: int, separators: tuple = ("\n\n", "\n", " ")) -> List[str]:
+    """Split text into chunks of at most max_chars, breaking at paragraphs, then lines, then words"""
+    if len(text) <= max_chars:
+        return [text]
+    if not separators:
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+    
+    separator, finer_separators = separators[0], separators[1:]
+    chunks = []
+    current = ""
+    for part in text.split(separator):
+        # Oversized parts (e.g. an OCR'd page with no blank lines) are split on the next finer separator
+        for piece in chunk_text(part, max_chars, finer_separators):
+            if current and len(current) + len(separator) + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+@st.cache_resource
+def pdfium_lock() -> threading.Lock:
+    """Process-wide lock for PDFium, which must not be called from several threads at once"""
+    return threading.Lock()
+
+def render_page_image(pdf: pdfium.PdfDocument, index: int, dpi: int, output_folder: str, lock: threading.Lock) -> str:
+    """Render one PDF page (0-based) to a grayscale image file for OCR and return its path"""
+    image_path = os.path.join(output_folder, f"page_{index + 1}.pgm")
+    with lock:
+        page = pdf[index]
+        try:
+            # Grayscale at a moderate DPI keeps text legible with far fewer pixels for Tesseract
+            bitmap = page.render(scale=dpi / 72, grayscale=True)
+            bitmap.to_pil().save(image_path)
+            bitmap.close()
+        finally:
+            page.close()
+    return image_path
+
+@st.cache_resource
+def openrouter_session() -> requests.Session:
+    """HTTP session shared by every OpenRouter call so keep-alive connections are reused"""
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=1,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None,  # Chat completions are POSTs, which urllib3 does not retry by default
+        read=0,  # A read timeout may mean the completion is still being generated (and billed); don't resend it
+        raise_on_status=False  # Hand the last error response back so raise_for_status reports it
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2 * MAX_CONCURRENT_REQUESTS, max_retries=retry))
+    return session
+
+@st.cache_resource
+def tesseract_api_pool() -> queue.Queue:
+    """Pool of initialized tesserocr engines reused across OCR runs and Streamlit reruns"""
+    return queue.Queue()
+
+def ocr_page_file(image_path: str, api_pool: queue.Queue) -> str:
+    """OCR a single rendered page image file, preferring a pooled in-process tesserocr engine"""
+    if PyTessBaseAPI is None:
+        return pytesseract.image_to_string(image_path, config='--psm 6')
+    
+    # Each engine loads the language model once; it is returned to the pool after use
+    try:
+        api = api_pool.get_nowait()
+    except queue.Empty:
+        api = PyTessBaseAPI(psm=PSM.SINGLE_BLOCK)
+    try:
+        api.SetImageFile(image_path)
+        return api.GetUTF8Text()
+    finally:
+        api_pool.put(api)
+
+# Raw API responses are written to disk only when DEBUG=true is set in .env
+DEBUG_API_RESPONSES = os.getenv("DEBUG", "false").lower() == "true"
+
+def _write_debug_files(write_queue: queue.Queue):
+    """Write queued (file name, content) pairs to disk off the request path"""
+    while True:
+        file_name, content = write_queue.get()
+        with open(file_name, "w", encoding="utf-8") as f:
+            f.write(content)
+
+@st.cache_resource
+def _debug_write_queue() -> queue.Queue:
+    """Start the debug file writer thread once per process"""
+    write_queue = queue.Queue()
+    threading.Thread(target=_write_debug_files, args=(write_queue,), daemon=True).start()
+    return write_queue
+
+def save_debug_response(prefix: str, content: str):
+    """Queue a raw API response for writing to a timestamped file when debugging is enabled"""
+    if DEBUG_API_RESPONSES:
+        _debug_write_queue().put((f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt", content))
+
+# Sidebar processing modes mapped to the number of concurrent chunk requests
+PROCESSING_MODES = {
+    "Fast (parallel)": MAX_CONCURRENT_REQUESTS,
+    "Conservative (sequential)": 1
+}
+
 class MedicalPDFAnalyzer:
     def __init__(self):
         # Load OpenRouter API key from environment
@@ -64,310 +415,266 @@ class MedicalPDFAnalyzer:
             st.info("Create a .env file with: OPENROUTER_API_KEY=your_openrouter_api_key_here")
             st.stop()
         
+        self.session = openrouter_session()
         self.model_loaded = True  # No local model loading required
         st.success("OpenRouter API configured successfully!")
     
-    def extract_text_from_pdf(self, pdf_file) -> str:
-        """Extract text from PDF using PyPDF2 first, then OCR for images"""
+    def extract_text_from_pdf(self, pdf_bytes: bytes, ocr_dpi: int = DEFAULT_OCR_DPI, enable_ocr: bool = True) -> Tuple[str, bool]:
+        """Extract text from PDF using PDFium first, then OCR only the pages without a text layer.
+        Returns the text and whether it is complete (False when OCR failed on some pages)"""
         try:
-            pdf_file.seek(0)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
+            # PDFium parses in native code, far faster than a pure-Python PDF parser
+            with pdfium_lock():
+                pdf = pdfium.PdfDocument(pdf_bytes)
+                try:
+                    page_texts = []
+                    for i in range(len(pdf)):
+                        page = pdf[i]
+                        text_page = page.get_textpage()
+                        page_texts.append(text_page.get_text_range().replace("\r\n", "\n"))
+                        text_page.close()
+                        page.close()
+                finally:
+                    pdf.close()
             
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
-                text += page_text + "\n"
+            # Scanned pages yield little or no embedded text; everything else skips OCR
+            pages_needing_ocr = [
+                i for i, page_text in enumerate(page_texts)
+                if sum(c.isalnum() for c in page_text) < MIN_PAGE_TEXT_CHARS
+            ]
+            ocr_incomplete = False
+            if pages_needing_ocr and not enable_ocr:
+                st.info(f"Little text found on {len(pages_needing_ocr)} of {len(page_texts)} pages. Enable OCR to extract scanned pages.")
+            elif pages_needing_ocr:
+                st.info(f"Little text found on {len(pages_needing_ocr)} of {len(page_texts)} pages, using OCR for scanned images...")
+                ocr_texts = self.extract_text_with_ocr(pdf_bytes, pages_needing_ocr, ocr_dpi)
+                for i, ocr_text in ocr_texts.items():
+                    if ocr_text.strip():
+                        page_texts[i] = f"Page {i+1}:\n{ocr_text}"
+                ocr_incomplete = len(ocr_texts) < len(pages_needing_ocr)
+                if ocr_incomplete:
+                    st.warning(f"OCR failed on {len(pages_needing_ocr) - len(ocr_texts)} of {len(pages_needing_ocr)} scanned pages; only the remaining pages were extracted.")
             
-            if len(text.strip()) < 100:
-                st.info("Little text found in PDF, using OCR for scanned images...")
-                return self.extract_text_with_ocr(pdf_file)
-            
-            return text
+            # Pages without text join into bare separators; report that as no text, not an empty document
+            text = PAGE_BREAK.join(page_texts)
+            if not text.strip():
+                return "", True
+            return text, not ocr_incomplete
         except Exception as e:
             st.error(f"Error extracting text from PDF: {str(e)}")
-            return ""
+            return "", True
     
-    def extract_text_with_ocr(self, pdf_file) -> str:
-        """Extract text from scanned PDF using OCR"""
+    def extract_text_with_ocr(self, pdf_bytes: bytes, page_indices: List[int], dpi: int = DEFAULT_OCR_DPI) -> Dict[int, str]:
+        """Extract text from the given scanned PDF pages (0-based) using OCR"""
         try:
-            pdf_file.seek(0)
-            with st.spinner("Converting PDF to images for OCR..."):
-                images = pdf2image.convert_from_bytes(pdf_file.read(), dpi=300)
-            
-            full_text = ""
-            progress_bar = st.progress(0)
-            
-            for i, image in enumerate(images):
-                progress_bar.progress((i + 1) / len(images))
-                text = pytesseract.image_to_string(image, config='--psm 6')
-                full_text += f"Page {i+1}:\n{text}\n\n"
+            # Rendered pages are spilled to disk and handed to Tesseract by path, so page
+            # bitmaps are not kept in Python memory or re-encoded for OCR
+            with tempfile.TemporaryDirectory() as output_folder:
+                lock = pdfium_lock()
+                with lock:
+                    pdf = pdfium.PdfDocument(pdf_bytes)
+                
+                page_texts = {}
+                progress_bar = st.progress(0)
+                
+                # One thread renders pages in order while OCR runs on pages already rendered.
+                # Tesseract releases the GIL and is multi-threaded itself, so use half the cores
+                try:
+                    with st.spinner(f"Running OCR on {len(page_indices)} pages..."), \
+                            ThreadPoolExecutor(max_workers=1) as renderer, \
+                            ThreadPoolExecutor(max_workers=max(1, min(OCR_MAX_WORKERS, len(page_indices)))) as executor:
+                        render_futures = [
+                            renderer.submit(render_page_image, pdf, i, dpi, output_folder, lock)
+                            for i in page_indices
+                        ]
+                        
+                        api_pool = tesseract_api_pool()
+                        futures = {
+                            executor.submit(ocr_page_file, render_future.result(), api_pool): i
+                            for i, render_future in zip(page_indices, render_futures)
+                        }
+                        
+                        for completed, future in enumerate(as_completed(futures), 1):
+                            page_texts[futures[future]] = future.result()
+                            progress_bar.progress(completed / len(futures))
+                finally:
+                    with lock:
+                        pdf.close()
             
             progress_bar.empty()
-            return full_text
+            return page_texts
         except Exception as e:
             st.error(f"Error with OCR extraction: {str(e)}")
-            return ""
+            return {}
     
-    def analyze_medical_data(self, text: str) -> Dict[str, Any]:
-        """Analyze medical data using Llama 3 via OpenRouter with comprehensive extraction"""
+    def analyze_medical_data(self, text: str, max_concurrency: int = MAX_CONCURRENT_REQUESTS) -> Tuple[Dict[str, Any], bool]:
+        """Analyze medical data using Llama 3 via OpenRouter with comprehensive extraction.
+        Returns the result and whether it is complete (False when some chunks failed)"""
         if not self.model_loaded:
             st.error("OpenRouter API not configured")
-            return {}
+            return {}, True
         
         try:
+            text = prefilter_text(text)
             # Estimate token count (rough: 1 token ≈ 4 chars)
             approx_tokens = len(text) // 4
             max_context_tokens = 7000  # Leave room for prompt and response
             max_chunk_chars = max_context_tokens * 4  # Approx chars per chunk
 
-            # Base prompt template
-            base_prompt = """
-            Analyze the following medical document chunk and extract ALL available information in JSON format. 
-            If any information is not found in the chunk, mark it as "N/A". Ensure the output is a valid JSON object.
-
-            Medical Document Chunk:
-            {text}
-
-            Provide a comprehensive analysis in this JSON structure:
-            {{
-                "document_metadata": {{
-                    "extraction_date": "{extraction_date}",
-                    "document_type": "medical_report",
-                    "file_source": "uploaded_pdf",
-                    "analysis_confidence": "high/medium/low",
-                    "text_length": {text_length},
-                    "extraction_method": "AI_analysis"
-                }},
-                "administrative_info": {{
-                    "bill_number": "N/A",
-                    "mr_number": "N/A",
-                    "room_ward_number": "N/A",
-                    "hospital_name": "N/A",
-                    "hospital_address": "N/A",
-                    "hospital_phone": "N/A",
-                    "department": "N/A",
-                    "admission_number": "N/A"
-                }},
-                "patient_info": {{
-                    "name": "N/A",
-                    "age": "N/A",
-                    "gender": "N/A",
-                    "date_of_birth": "N/A",
-                    "address": "N/A",
-                    "phone_number": "N/A",
-                    "emergency_contact": "N/A",
-                    "insurance_info": "N/A",
-                    "patient_id": "N/A"
-                }},
-                "visit_details": {{
-                    "date_of_visit": "N/A",
-                    "admission_date": "N/A",
-                    "discharge_date": "N/A",
-                    "visit_type": "N/A",
-                    "chief_complaint": "N/A",
-                    "referring_physician": "N/A"
-                }},
-                "medical_staff": {{
-                    "attending_physician": "N/A",
-                    "consultant_name": "N/A",
-                    "resident_doctor": "N/A",
-                    "nurse_in_charge": "N/A",
-                    "other_staff": []
-                }},
-                "vital_signs": {{
-                    "blood_pressure_systolic": "N/A",
-                    "blood_pressure_diastolic": "N/A",
-                    "heart_rate": "N/A",
-                    "temperature": "N/A",
-                    "respiratory_rate": "N/A",
-                    "oxygen_saturation": "N/A",
-                    "weight": "N/A",
-                    "height": "N/A",
-                    "bmi": "N/A",
-                    "pain_scale": "N/A"
-                }},
-                "lab_results": [],
-                "medications": [],
-                "procedures": [],
-                "diagnoses": [],
-                "imaging_studies": [],
-                "appointments_schedule": [],
-                "doctor_recommendations": [],
-                "discharge_instructions": [],
-                "key_findings": [],
-                "risk_factors": [],
-                "allergies": [],
-                "medical_history": [],
-                "family_history": [],
-                "social_history": {{
-                    "smoking": "N/A",
-                    "alcohol": "N/A",
-                    "occupation": "N/A",
-                    "exercise": "N/A"
-                }},
-                "follow_up_required": "N/A",
-                "billing_info": {{
-                    "total_charges": "N/A",
-                    "insurance_coverage": "N/A",
-                    "patient_responsibility": "N/A",
-                    "payment_status": "N/A"
-                }},
-                "chart_data": {{
-                    "trend_analysis": [],
-                    "comparison_data": [],
-                    "time_series": []
-                }}
-            }}
-            
-            Ensure the response is a valid JSON object enclosed in curly braces. Extract ALL numerical values for charts.
-            """
-            
             # Initialize result dictionary
             final_result = {}
             
             if approx_tokens <= max_context_tokens:
                 # Process entire text if within context limit
                 st.info(f"Analyzing document with {len(text)} characters (~{approx_tokens} tokens)...")
-                with st.spinner("Analyzing with Llama 3 via OpenRouter..."):
-                    headers = {
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    }
-                    payload = {
-                        "model": "meta-llama/llama-3.1-8b-instruct",
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": base_prompt.format(
-                                    text=text,
-                                    extraction_date=datetime.now().isoformat(),
-                                    text_length=len(text)
-                                )
-                            }
-                        ],
-                        "max_tokens": 6000,  # Increased to handle larger responses
-                        "temperature": 0.1
-                    }
-                    
+                with st.spinner(f"Analyzing with {MODEL_NAME} via OpenRouter..."):
                     try:
-                        response = requests.post(
-                            "https://openrouter.ai/api/v1/chat/completions",
-                            headers=headers,
-                            json=payload,
-                            timeout=30
-                        )
-                        response.raise_for_status()
-                        
-                        analysis_text = response.json()["choices"][0]["message"]["content"]
+                        # Stream tokens into a placeholder so the user sees the model working
+                        stream_placeholder = st.empty()
+                        streamed_parts = []
+                        last_render = 0.0
+                        for delta in self._stream_openrouter(self._build_payload(text)):
+                            streamed_parts.append(delta)
+                            if time.monotonic() - last_render >= STREAM_RENDER_INTERVAL:
+                                stream_placeholder.code("".join(streamed_parts), language="json")
+                                last_render = time.monotonic()
+                        stream_placeholder.empty()
+                        analysis_text = "".join(streamed_parts)
                         # Log raw response for debugging
-                        with open(f"api_response_single_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt", "w", encoding="utf-8") as f:
-                            f.write(analysis_text)
-                        
-                        # Improved regex to handle JSON within markdown or plain text
-                        json_match = re.search(r'\{[\s\S]*\}', analysis_text)
-                        if not json_match:
-                            st.error(f"Failed to extract valid JSON from API response. Raw response saved to api_response_single.txt")
-                            st.text_area("Raw API Response", analysis_text[:2000], height=200)
-                            return {}
+                        save_debug_response("api_response_single", analysis_text)
                         
                         try:
-                            final_result = json.loads(json_match.group())
+                            final_result = self._complete_result(parse_model_json(analysis_text), text)
                         except json.JSONDecodeError as e:
-                            st.error(f"JSON parsing error: {str(e)}. Raw response saved to api_response_single.txt")
-                            st.text_area("Raw API Response", analysis_text[:2000], height=200)
-                            return {}
+                            st.error(f"JSON parsing error: {str(e)}")
+                            # Plain elements only: widgets must not be created inside the cached analysis
+                            st.caption("Raw API Response")
+                            st.code(analysis_text[:2000], language="json")
+                            return {}, True
                     except requests.exceptions.RequestException as e:
                         st.error(f"API request failed: {str(e)}")
-                        return {}
+                        return {}, True
             else:
-                # Chunk the text at paragraph breaks to preserve context
+                # Chunk the text at paragraph breaks to preserve context; oversized paragraphs are split further
                 st.warning(f"Document is large ({len(text)} chars, ~{approx_tokens} tokens). Processing in chunks...")
-                chunks = []
-                current_chunk = ""
-                for paragraph in text.split("\n\n"):
-                    if len(current_chunk) + len(paragraph) + 2 <= max_chunk_chars:
-                        current_chunk += paragraph + "\n\n"
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk)
-                        current_chunk = paragraph + "\n\n"
-                if current_chunk:
-                    chunks.append(current_chunk)
+                chunks = chunk_text(text, max_chunk_chars)
                 
                 st.info(f"Processing {len(chunks)} chunks...")
                 progress_bar = st.progress(0)
-                chunk_results = []
+                responses = [None] * len(chunks)
                 
-                for i, chunk in enumerate(chunks):
-                    with st.spinner(f"Analyzing chunk {i+1}/{len(chunks)}..."):
-                        headers = {
-                            "Authorization": f"Bearer {self.api_key}",
-                            "Content-Type": "application/json"
-                        }
-                        payload = {
-                            "model": "meta-llama/llama-3.1-8b-instruct",
-                            "messages": [
-                                {
-                                    "role": "user",
-                                    "content": base_prompt.format(
-                                        text=chunk,
-                                        extraction_date=datetime.now().isoformat(),
-                                        text_length=len(chunk)
-                                    )
-                                }
-                            ],
-                            "max_tokens": 6000,
-                            "temperature": 0.1
+                # Fire chunk requests concurrently; the work is remote so threads only wait on the network
+                with st.spinner(f"Analyzing {len(chunks)} chunks..."):
+                    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(chunks)))) as executor:
+                        futures = {
+                            executor.submit(self._call_openrouter, self._build_payload(chunk)): i
+                            for i, chunk in enumerate(chunks)
                         }
-                        
-                        try:
-                            response = requests.post(
-                                "https://openrouter.ai/api/v1/chat/completions",
-                                headers=headers,
-                                json=payload,
-                                timeout=30
-                            )
-                            response.raise_for_status()
-                            
-                            analysis_text = response.json()["choices"][0]["message"]["content"]
-                            # Log raw response for debugging
-                            with open(f"api_response_chunk_{i+1}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt", "w", encoding="utf-8") as f:
-                                f.write(analysis_text)
-                            
-                            # Improved regex to handle JSON within markdown or plain text
-                            json_match = re.search(r'\{[\s\S]*\}', analysis_text)
-                            if not json_match:
-                                st.warning(f"Failed to extract valid JSON from chunk {i+1}. Skipping chunk. Raw response saved to api_response_chunk_{i+1}.txt")
-                                st.text_area(f"Raw API Response for Chunk {i+1}", analysis_text[:2000], height=200)
-                                continue
-                            
+                        for completed, future in enumerate(as_completed(futures), 1):
+                            i = futures[future]
                             try:
-                                chunk_result = json.loads(json_match.group())
-                                chunk_results.append(chunk_result)
-                            except json.JSONDecodeError as e:
-                                st.warning(f"JSON parsing error in chunk {i+1}: {str(e)}. Skipping chunk. Raw response saved to api_response_chunk_{i+1}.txt")
-                                st.text_area(f"Raw API Response for Chunk {i+1}", analysis_text[:2000], height=200)
-                                continue
-                        except requests.exceptions.RequestException as e:
-                            st.warning(f"API request failed for chunk {i+1}: {str(e)}. Skipping chunk.")
-                            continue
-                        
-                    progress_bar.progress((i + 1) / len(chunks))
+                                responses[i] = future.result()
+                            except requests.exceptions.RequestException as e:
+                                st.warning(f"API request failed for chunk {i+1}: {str(e)}. Skipping chunk.")
+                            progress_bar.progress(completed / len(chunks))
                 
                 progress_bar.empty()
+                chunk_results = []
+                
+                for i, analysis_text in enumerate(responses):
+                    if analysis_text is None:
+                        continue
+                    
+                    # Log raw response for debugging
+                    save_debug_response(f"api_response_chunk_{i+1}", analysis_text)
+                    
+                    try:
+                        chunk_result = self._complete_result(parse_model_json(analysis_text), chunks[i])
+                        chunk_results.append(chunk_result)
+                    except json.JSONDecodeError as e:
+                        st.warning(f"JSON parsing error in chunk {i+1}: {str(e)}. Skipping chunk.")
+                        st.caption(f"Raw API Response for Chunk {i+1}")
+                        st.code(analysis_text[:2000], language="json")
+                        continue
                 
                 if not chunk_results:
                     st.error("No valid chunks processed. Please try a smaller document or check API settings.")
-                    return {}
+                    return {}, True
                 
                 # Merge chunk results
                 final_result = self.merge_chunk_results(chunk_results)
+                if len(chunk_results) < len(chunks):
+                    st.warning(f"{len(chunks) - len(chunk_results)} of {len(chunks)} chunks could not be analyzed; results are incomplete.")
+                    return final_result, False
             
-            return final_result
+            return final_result, True
                 
         except Exception as e:
             st.error(f"Unexpected error analyzing medical data: {str(e)}")
-            return {}
+            return {}, True
+    
+    def _build_payload(self, text: str) -> Dict[str, Any]:
+        """Build the OpenRouter chat payload for a piece of document text"""
+        system_content = SYSTEM_PROMPT
+        if MODEL_NAME.startswith("anthropic/"):
+            # Anthropic models only cache prefixes marked with an explicit breakpoint
+            system_content = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+        
+        return {
+            "model": MODEL_NAME,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": system_content
+                },
+                {
+                    "role": "user",
+                    "content": f"Medical Document Chunk:\n{text}"
+                }
+            ],
+            "max_tokens": 6000,  # Increased to handle larger responses
+            "temperature": 0.1,
+            # Constrain output to a JSON object and only route to providers that honour it
+            "response_format": {"type": "json_object"},
+            "provider": {"require_parameters": True}
+        }
+    
+    def _complete_result(self, result: Any, text: str) -> Dict[str, Any]:
+        """Fill sections the model omitted with defaults and record locally known metadata"""
+        result = fill_defaults(result, DEFAULT_REPORT)
+        result["document_metadata"]["extraction_date"] = datetime.now().isoformat()
+        result["document_metadata"]["text_length"] = len(text)
+        return result
+    
+    def _post_openrouter(self, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """POST a payload to OpenRouter; retries and backoff are handled by the session's adapter"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        response = self.session.post(OPENROUTER_URL, headers=headers, json=payload, timeout=OPENROUTER_TIMEOUT, stream=stream)
+        response.raise_for_status()
+        return response
+    
+    def _call_openrouter(self, payload: Dict[str, Any]) -> str:
+        """Send a payload to OpenRouter and return the complete message content"""
+        return self._post_openrouter(payload).json()["choices"][0]["message"]["content"]
+    
+    def _stream_openrouter(self, payload: Dict[str, Any]) -> Iterator[str]:
+        """Send a payload to OpenRouter with streaming enabled and yield content deltas as they arrive"""
+        with self._post_openrouter({**payload, "stream": True}, stream=True) as response:
+            response.encoding = "utf-8"  # SSE responses often omit a charset
+            for line in response.iter_lines(decode_unicode=True):
+                # Server-sent events: "data: {...}" frames, ": ..." keep-alive comments and a final "data: [DONE]"
+                if not line or not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+                delta = json_loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
     
     def merge_chunk_results(self, chunk_results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Merge multiple JSON results from chunked text analysis"""
@@ -376,47 +683,28 @@ class MedicalPDFAnalyzer:
         
         # Initialize merged result with the first chunk's structure
         merged_result = chunk_results[0].copy()
+        chunk_metadata = [chunk.get("document_metadata") or {} for chunk in chunk_results]
         
-        # Update document_metadata
-        merged_result["document_metadata"]["text_length"] = sum(
-            chunk["document_metadata"]["text_length"] for chunk in chunk_results
-        )
-        merged_result["document_metadata"]["extraction_date"] = datetime.now().isoformat()
-        
-        # Merge list-based fields
-        list_fields = [
-            "lab_results", "medications", "procedures", "diagnoses", "imaging_studies",
-            "appointments_schedule", "doctor_recommendations", "discharge_instructions",
-            "key_findings", "risk_factors", "allergies", "medical_history", "family_history"
-        ]
+        # Update document_metadata, using the lowest confidence across chunks
+        min_confidence = min(CONFIDENCE_LEVELS.get(metadata.get("analysis_confidence"), 1) for metadata in chunk_metadata)
+        merged_result["document_metadata"] = {
+            **chunk_metadata[0],
+            "text_length": sum(metadata.get("text_length") or 0 for metadata in chunk_metadata),
+            "extraction_date": datetime.now().isoformat(),
+            "analysis_confidence": next(k for k, v in CONFIDENCE_LEVELS.items() if v == min_confidence)
+        }
         
-        for field in list_fields:
-            merged_result[field] = []
-            for chunk in chunk_results:
-                if chunk.get(field):
-                    merged_result[field].extend(chunk[field])
+        # Concatenate list-based fields across chunks, dropping entries repeated by several chunks
+        for field in LIST_FIELDS:
+            merged_result[field] = dedupe_items(chain.from_iterable(chunk.get(field) or () for chunk in chunk_results))
         
         # For dictionary fields, take the first non-empty value or keep N/A
-        dict_fields = [
-            "administrative_info", "patient_info", "visit_details", "medical_staff",
-            "vital_signs", "social_history", "billing_info", "chart_data"
-        ]
-        
-        for field in dict_fields:
-            for chunk in chunk_results:
-                if chunk.get(field) and any(v != "N/A" and v for v in chunk[field].values()):
-                    merged_result[field] = chunk[field]
-                    break
-        
-        # Update analysis_confidence based on the lowest confidence across chunks
-        confidences = {"high": 3, "medium": 2, "low": 1}
-        min_confidence = min(
-            confidences.get(chunk["document_metadata"]["analysis_confidence"], 1)
-            for chunk in chunk_results
-        )
-        merged_result["document_metadata"]["analysis_confidence"] = next(
-            k for k, v in confidences.items() if v == min_confidence
-        )
+        for field in DICT_FIELDS:
+            merged_result[field] = next(
+                (chunk[field] for chunk in chunk_results
+                 if isinstance(chunk.get(field), dict) and any(map(is_populated, chunk[field].values()))),
+                merged_result.get(field)
+            )
         
         return merged_result
     
@@ -428,42 +716,12 @@ class MedicalPDFAnalyzer:
             st.warning("No data available for this section")
             return
         
-        # Create a formatted display
-        with st.container():
-            # Use columns for better layout
-            col1, col2 = st.columns([1, 2])
-            
-            with col1:
-                st.markdown("**Field**")
-            with col2:
-                st.markdown("**Value**")
-            
-            st.divider()
-            
-            for key, value in data.items():
-                col1, col2 = st.columns([1, 2])
-                
-                with col1:
-                    # Format field name
-                    field_name = key.replace('_', ' ').title()
-                    st.markdown(f"**{field_name}:**")
-                
-                with col2:
-                    # Format value based on type
-                    if isinstance(value, list):
-                        if value:
-                            for item in value:
-                                st.write(f"• {item}")
-                        else:
-                            st.write("*No items*")
-                    elif isinstance(value, dict):
-                        st.json(value)
-                    else:
-                        # Handle N/A values
-                        if str(value) == "N/A":
-                            st.write("*Not Available*")
-                        else:
-                            st.write(str(value))
+        # Render the whole section as one markdown table instead of a column pair and
+        # several elements per field, so long sections send a single element to the browser
+        rows = ["| Field | Value |", "| --- | --- |"]
+        for key, value in data.items():
+            rows.append(f"| **{key.replace('_', ' ').title()}** | {format_markdown_cell(value)} |")
+        st.markdown("\n".join(rows))
     
     def display_list_metadata_table(self, title: str, data: List[Dict[str, Any]], icon: str = "📋"):
         """Display list-based metadata in a tabular format"""
@@ -476,17 +734,24 @@ class MedicalPDFAnalyzer:
         # Display count
         st.info(f"Total {title}: {len(data)}")
         
-        # Convert data to DataFrame
-        df = pd.DataFrame(data)
+        # Split the model's items once: objects become table rows, anything else (plain strings)
+        # is listed below the table instead of breaking the DataFrame conversion
+        records, other_items = [], []
+        for item in data:
+            (records if isinstance(item, dict) else other_items).append(item)
         
-        # Replace 'N/A' with a more readable format for display
-        df = df.fillna("Not Available")
-        
-        # Format column names
-        df.columns = [col.replace('_', ' ').title() for col in df.columns]
+        if records:
+            # Convert data to a display DataFrame, reused across reruns
+            df = build_display_dataframe(records)
+            
+            # Display the table; long tables send only a preview unless the user asks for every row
+            if len(df) > TABLE_PREVIEW_ROWS and not st.checkbox(f"Show all {len(df)} rows", key=f"show_all_{title}"):
+                st.caption(f"Showing the first {TABLE_PREVIEW_ROWS} of {len(df)} rows")
+                df = df.head(TABLE_PREVIEW_ROWS)
+            st.dataframe(df, use_container_width=True)
         
-        # Display the table
-        st.dataframe(df, use_container_width=True)
+        if other_items:
+            st.markdown("\n".join(f"- {item}" for item in other_items))
     
     def display_simple_list_table(self, title: str, data: List[str], icon: str = "📋"):
         """Display simple list data (e.g., recommendations, instructions) in a single-column table"""
@@ -520,51 +785,31 @@ class MedicalPDFAnalyzer:
     
     def create_metadata_summary(self, analysis_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a comprehensive metadata summary"""
-        summary = {
+        content_statistics = {stat: len(analysis_data.get(field, [])) for stat, field in SUMMARY_COUNT_FIELDS}
+        section_completeness = [self.calculate_completeness(analysis_data.get(field, {})) for field in COMPLETENESS_FIELDS]
+        content_statistics["billing_info_completeness"] = section_completeness[0]
+        
+        # Overall completeness is the mean over the key dict sections
+        total_completeness = sum(section_completeness)
+        return {
             "extraction_timestamp": datetime.now().isoformat(),
             "document_analysis_stats": {
                 "total_sections": len(analysis_data),
-                "populated_sections": sum(1 for section in analysis_data.values() if section and section != "N/A"),
-                "data_completeness_percentage": 0
+                "populated_sections": sum(map(is_populated, analysis_data.values())),
+                "data_completeness_percentage": total_completeness / len(COMPLETENESS_FIELDS) if total_completeness > 0 else 0
             },
-            "content_statistics": {
-                "medications_count": len(analysis_data.get("medications", [])),
-                "lab_results_count": len(analysis_data.get("lab_results", [])),
-                "procedures_count": len(analysis_data.get("procedures", [])),
-                "diagnoses_count": len(analysis_data.get("diagnoses", [])),
-                "imaging_studies_count": len(analysis_data.get("imaging_studies", [])),
-                "appointments_count": len(analysis_data.get("appointments_schedule", [])),
-                "risk_factors_count": len(analysis_data.get("risk_factors", [])),
-                "allergies_count": len(analysis_data.get("allergies", [])),
-                "recommendations_count": len(analysis_data.get("doctor_recommendations", [])),
-                "discharge_instructions_count": len(analysis_data.get("discharge_instructions", [])),
-                "billing_info_completeness": self.calculate_completeness(analysis_data.get("billing_info", {}))
-            }
+            "content_statistics": content_statistics
         }
-        
-        # Calculate overall completeness
-        total_completeness = sum([
-            summary["content_statistics"]["billing_info_completeness"],
-            self.calculate_completeness(analysis_data.get("vital_signs", {})),
-            self.calculate_completeness(analysis_data.get("patient_info", {})),
-            self.calculate_completeness(analysis_data.get("administrative_info", {})),
-            self.calculate_completeness(analysis_data.get("visit_details", {}))
-        ])
-        summary["document_analysis_stats"]["data_completeness_percentage"] = total_completeness / 5 if total_completeness > 0 else 0
-        
-        return summary
     
     def calculate_completeness(self, data: Dict[str, Any]) -> float:
         """Calculate completeness percentage for a data section"""
         if not data:
             return 0.0
         
-        total_fields = len(data)
-        populated_fields = sum(1 for value in data.values() if value and str(value) != "N/A")
-        
-        return (populated_fields / total_fields * 100) if total_fields > 0 else 0.0
+        populated_fields = sum(map(is_populated, data.values()))
+        return populated_fields / len(data) * 100
     
-    def display_complete_metadata(self, analysis_data: Dict[str, Any]):
+    def display_complete_metadata(self, analysis_data: Dict[str, Any], analysis_key: Optional[str] = None):
         """Display all extracted information in metadata format"""
         st.header("🔍 Complete Medical Document Metadata")
         
@@ -584,18 +829,12 @@ class MedicalPDFAnalyzer:
         with col4:
             st.metric("Content Items", sum([v for k, v in metadata_summary["content_statistics"].items() if k != "billing_info_completeness"]))
         
-        # Display detailed metadata in organized sections
-        metadata_tabs = st.tabs([
-            "📋 Document Metadata",
-            "🏥 Administrative Data", 
-            "👤 Patient Information",
-            "🩺 Medical Data",
-            "💰 Billing",
-            "🔍 Raw Data Structure"
-        ])
+        # Display detailed metadata in organized sections. st.tabs would run every tab body on each
+        # rerun, so a horizontal radio selects the section and only that one is built
+        active_section = st.radio("Section", METADATA_SECTIONS, horizontal=True, key="metadata_section", label_visibility="collapsed")
         
-        with metadata_tabs[0]:
-            st.header("📋 Document Metadata")
+        if active_section == SECTION_DOCUMENT:
+            st.header(SECTION_DOCUMENT)
             
             # Document metadata
             if analysis_data.get("document_metadata"):
@@ -609,15 +848,15 @@ class MedicalPDFAnalyzer:
             if analysis_data.get("medical_staff"):
                 self.display_metadata_section("Medical Staff", analysis_data["medical_staff"], "👨‍⚕️")
         
-        with metadata_tabs[1]:
-            st.header("🏥 Administrative Data")
+        elif active_section == SECTION_ADMINISTRATIVE:
+            st.header(SECTION_ADMINISTRATIVE)
             
             # Administrative info
             if analysis_data.get("administrative_info"):
                 self.display_metadata_section("Administrative Information", analysis_data["administrative_info"], "📋")
         
-        with metadata_tabs[2]:
-            st.header("👤 Patient Information")
+        elif active_section == SECTION_PATIENT:
+            st.header(SECTION_PATIENT)
             
             # Patient info
             if analysis_data.get("patient_info"):
@@ -631,26 +870,24 @@ class MedicalPDFAnalyzer:
             if analysis_data.get("social_history"):
                 self.display_metadata_section("Social History", analysis_data["social_history"], "👥")
             
+            # Lists are joined into one element each rather than one element per item
             # Medical history
             if analysis_data.get("medical_history"):
                 st.subheader("📋 Medical History")
-                for item in analysis_data["medical_history"]:
-                    st.write(f"• {item}")
+                st.markdown("\n".join(f"- {item}" for item in analysis_data["medical_history"]))
             
             # Family history
             if analysis_data.get("family_history"):
                 st.subheader("👨‍👩‍👧‍👦 Family History")
-                for item in analysis_data["family_history"]:
-                    st.write(f"• {item}")
+                st.markdown("\n".join(f"- {item}" for item in analysis_data["family_history"]))
             
             # Allergies
             if analysis_data.get("allergies"):
                 st.subheader("🚨 Allergies")
-                for allergy in analysis_data["allergies"]:
-                    st.warning(f"⚠️ {allergy}")
+                st.warning("\n".join(f"- {allergy}" for allergy in analysis_data["allergies"]), icon="⚠️")
         
-        with metadata_tabs[3]:
-            st.header("🩺 Medical Data")
+        elif active_section == SECTION_MEDICAL:
+            st.header(SECTION_MEDICAL)
             
             # Lab results
             if analysis_data.get("lab_results"):
@@ -676,114 +913,229 @@ class MedicalPDFAnalyzer:
             if analysis_data.get("appointments_schedule"):
                 self.display_list_metadata_table("Appointments", analysis_data["appointments_schedule"], "📅")
             
-            # Recommendations
-            if analysis_data.get("doctor_recommendations"):
-                self.display_simple_list_table("Doctor Recommendations", analysis_data["doctor_recommendations"], "👨‍⚕️")
-            
-            # Discharge instructions
-            if analysis_data.get("discharge_instructions"):
-                self.display_simple_list_table("Discharge Instructions", analysis_data["discharge_instructions"], "🏠")
-            
-            # Key findings
-            if analysis_data.get("key_findings"):
-                self.display_simple_list_table("Key Findings", analysis_data["key_findings"], "🔍")
-            
-            # Risk factors
-            if analysis_data.get("risk_factors"):
-                self.display_simple_list_table("Risk Factors", analysis_data["risk_factors"], "⚠️")
+            # Recommendations, discharge instructions, key findings and risk factors
+            for field, title, icon in SIMPLE_LIST_SECTIONS:
+                if items := analysis_data.get(field):
+                    self.display_simple_list_table(title, items, icon)
         
-        with metadata_tabs[4]:
-            st.header("💰 Billing")
+        elif active_section == SECTION_BILLING:
+            st.header(SECTION_BILLING)
             
             # Billing info
             if analysis_data.get("billing_info"):
                 self.display_metadata_section("Billing Information", analysis_data["billing_info"], "💰")
         
-        with metadata_tabs[5]:
-            st.header("🔍 Raw Data Structure")
+        elif active_section == SECTION_RAW:
+            st.header(SECTION_RAW)
             
-            # Show complete raw data structure
+            # Show complete raw data structure; the JSON tree widget is slow to paint for large
+            # extractions, so it is only sent to the browser on request
             st.subheader("📊 Complete Extracted Data")
-            st.json(analysis_data)
+            if st.checkbox("Show complete JSON structure (may be slow for large documents)", key="show_raw_json"):
+                st.json(analysis_data, expanded=False)
             
             # Data export section
             st.subheader("📥 Export Options")
             
-            # Prepare complete metadata for download
-            complete_metadata = {
-                "metadata_summary": metadata_summary,
-                "extracted_data": analysis_data,
-                "export_timestamp": datetime.now().isoformat(),
-                "export_format": "complete_metadata_json"
-            }
+            # Payloads are only built once the user asks for them; afterwards the flag keeps the
+            # buttons visible for this analysis and the cached payloads are reused
+            prepared = analysis_key is not None and st.session_state.get("downloads_prepared") == analysis_key
+            if not prepared:
+                if not st.button("Prepare downloads", key="prepare_downloads"):
+                    return
+                st.session_state["downloads_prepared"] = analysis_key
+            
+            # Prepare complete metadata and the structured report for download
+            exports = build_exports(self, analysis_data, metadata_summary, analysis_key)
+            file_timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             
             col1, col2 = st.columns(2)
             
             with col1:
                 st.download_button(
                     label="📥 Download Complete Metadata (JSON)",
-                    data=json.dumps(complete_metadata, indent=2, ensure_ascii=False),
-                    file_name=f"complete_metadata_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                    data=exports["metadata_json"],
+                    file_name=f"complete_metadata_{file_timestamp}.json",
                     mime="application/json"
                 )
             
             with col2:
-                # Create structured metadata report
-                metadata_report = self.create_metadata_report(metadata_summary, analysis_data)
                 st.download_button(
                     label="📄 Download Metadata Report (TXT)",
-                    data=metadata_report,
-                    file_name=f"metadata_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                    data=exports["report_txt"],
+                    file_name=f"metadata_report_{file_timestamp}.txt",
                     mime="text/plain"
                 )
 
     def create_metadata_report(self, metadata_summary: Dict[str, Any], analysis_data: Dict[str, Any]) -> str:
         """Create a comprehensive metadata report"""
-        report = f"""
+        stats = metadata_summary['document_analysis_stats']
+        generated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Accumulate lines and join once; repeated += copies the whole report each time
+        parts = [f"""
 # COMPREHENSIVE MEDICAL DOCUMENT METADATA REPORT
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+Generated: {generated}
 
 ## METADATA SUMMARY
-Total Sections: {metadata_summary['document_analysis_stats']['total_sections']}
-Populated Sections: {metadata_summary['document_analysis_stats']['populated_sections']}
-Data Completeness: {metadata_summary['document_analysis_stats']['data_completeness_percentage']:.1f}%
+Total Sections: {stats['total_sections']}
+Populated Sections: {stats['populated_sections']}
+Data Completeness: {stats['data_completeness_percentage']:.1f}%
 
 ## CONTENT STATISTICS
-"""
+"""]
         
         for key, value in metadata_summary["content_statistics"].items():
             if key != "billing_info_completeness":
-                report += f"{key.replace('_', ' ').title()}: {value}\n"
+                parts.append(f"{key.replace('_', ' ').title()}: {value}\n")
         
-        report += "\n## BILLING INFORMATION\n"
+        parts.append("\n## BILLING INFORMATION\n")
         billing_info = analysis_data.get("billing_info", {})
         if billing_info:
             for key, value in billing_info.items():
-                report += f"{key.replace('_', ' ').title()}: {value}\n"
+                parts.append(f"{key.replace('_', ' ').title()}: {value}\n")
         else:
-            report += "No billing information available\n"
+            parts.append("No billing information available\n")
         
-        report += "\n## DETAILED SECTION BREAKDOWN\n"
+        parts.append("\n## DETAILED SECTION BREAKDOWN\n")
         
         for section_name, section_data in analysis_data.items():
             if section_name in ["document_metadata", "billing_info"]:
                 continue
             if section_data and section_data != "N/A":
-                report += f"\n### {section_name.replace('_', ' ').upper()}\n"
+                parts.append(f"\n### {section_name.replace('_', ' ').upper()}\n")
                 
                 if isinstance(section_data, dict):
                     for key, value in section_data.items():
-                        report += f"  {key.replace('_', ' ').title()}: {value}\n"
+                        parts.append(f"  {key.replace('_', ' ').title()}: {value}\n")
                 elif isinstance(section_data, list):
-                    report += f"  Items: {len(section_data)}\n"
+                    parts.append(f"  Items: {len(section_data)}\n")
                     for i, item in enumerate(section_data[:3], 1):  # Show first 3 items
-                        report += f"    {i}. {item}\n"
+                        parts.append(f"    {i}. {item}\n")
                     if len(section_data) > 3:
-                        report += f"    ... and {len(section_data) - 3} more items\n"
+                        parts.append(f"    ... and {len(section_data) - 3} more items\n")
                 else:
-                    report += f"  Value: {section_data}\n"
+                    parts.append(f"  Value: {section_data}\n")
         
-        return report
+        return "".join(parts)
+
+def build_display_dataframe(data: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Convert list-based metadata to a display DataFrame"""
+    df = pd.DataFrame(data)
+    
+    # Replace missing values with a more readable format for display
+    df = df.fillna("Not Available")
+    
+    # Format column names
+    df.columns = [str(col).replace('_', ' ').title() for col in df.columns]
+    return df
+
+
+# Extracted text and analysis results contain patient data, so they are kept in memory only
+# unless PERSIST_CACHE=true opts in to Streamlit's on-disk cache (~/.streamlit/cache)
+CACHE_PERSIST = "disk" if os.getenv("PERSIST_CACHE", "false").lower() == "true" else None
+
+
+class _UncacheableResult(Exception):
+    """Raised inside cached helpers so failed (empty) results are not memoized"""
+
+
+class _PartialResult(Exception):
+    """Raised inside cached helpers with a usable result that is missing parts (failed OCR pages
+    or analysis chunks), so it is shown without being cached and retried next time"""
+    def __init__(self, result: Any):
+        super().__init__()
+        self.result = result
+
+
+@st.cache_data(show_spinner=False, max_entries=16, persist=CACHE_PERSIST)
+def _extract_text_cached(pdf_sha256: str, ocr_dpi: int, enable_ocr: bool, _analyzer: MedicalPDFAnalyzer, _pdf_bytes: bytes) -> str:
+    text, complete = _analyzer.extract_text_from_pdf(_pdf_bytes, ocr_dpi, enable_ocr)
+    if not text:
+        raise _UncacheableResult()
+    if not complete:
+        raise _PartialResult(text)
+    return text
+
+
+# Analysis results are small dicts, so keep many more of them than extracted texts
+@st.cache_data(show_spinner=False, max_entries=128, persist=CACHE_PERSIST)
+def _analyze_medical_data_cached(text_sha256: str, model_name: str, prompt_version: str, _analyzer: MedicalPDFAnalyzer, _text: str, _max_concurrency: int) -> Dict[str, Any]:
+    analysis_data, complete = _analyzer.analyze_medical_data(_text, _max_concurrency)
+    if not analysis_data:
+        raise _UncacheableResult()
+    if not complete:
+        raise _PartialResult(analysis_data)
+    return analysis_data
+
+
+def upload_sha256(file_id: str, pdf_bytes: bytes) -> str:
+    """Hash an upload once and remember the digest in session state for later reruns"""
+    digests = st.session_state.setdefault("pdf_upload_sha256", {})
+    if file_id not in digests:
+        digests[file_id] = hashlib.sha256(pdf_bytes).hexdigest()
+    return digests[file_id]
+
+
+def extract_text_cached(analyzer: MedicalPDFAnalyzer, pdf_bytes: bytes, pdf_sha256: str, ocr_dpi: int, enable_ocr: bool) -> str:
+    """Extract PDF text, reusing earlier results for identical uploads keyed by their SHA-256"""
+    try:
+        return _extract_text_cached(pdf_sha256, ocr_dpi, enable_ocr, analyzer, pdf_bytes)
+    except _PartialResult as e:
+        return e.result
+    except _UncacheableResult:
+        return ""
+
+
+def analyze_medical_data_cached(analyzer: MedicalPDFAnalyzer, text: str, max_concurrency: int) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Analyze extracted text, reusing earlier LLM results for identical text, model and prompt.
+    Also returns the analysis key (the same inputs) for caching derived artifacts, or None when
+    the result is partial or failed and must not be memoized"""
+    text_sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    try:
+        analysis_data = _analyze_medical_data_cached(text_sha256, MODEL_NAME, PROMPT_VERSION, analyzer, text, max_concurrency)
+    except _PartialResult as e:
+        return e.result, None
+    except _UncacheableResult:
+        return {}, None
+    return analysis_data, f"{text_sha256}:{MODEL_NAME}:{PROMPT_VERSION}"
+
+
+def create_exports(analyzer: MedicalPDFAnalyzer, analysis_data: Dict[str, Any], metadata_summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Serialize the complete metadata JSON and the text report for download"""
+    complete_metadata = {
+        "metadata_summary": metadata_summary,
+        "extracted_data": analysis_data,
+        "export_timestamp": datetime.now().isoformat(),
+        "export_format": "complete_metadata_json"
+    }
+    return {
+        "metadata_json": json_dumps_pretty(complete_metadata),
+        "report_txt": analyzer.create_metadata_report(metadata_summary, analysis_data).encode("utf-8")
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _build_exports(analysis_key: str, _analyzer: MedicalPDFAnalyzer, _analysis_data: Dict[str, Any], _metadata_summary: Dict[str, Any]) -> Dict[str, Any]:
+    return create_exports(_analyzer, _analysis_data, _metadata_summary)
+
+
+def build_exports(analyzer: MedicalPDFAnalyzer, analysis_data: Dict[str, Any], metadata_summary: Dict[str, Any], analysis_key: Optional[str]) -> Dict[str, Any]:
+    """Serialize the download payloads once per analysis, keyed on the analysis inputs rather than
+    a digest of the result; partial results (no key) are serialized without caching"""
+    if analysis_key is None:
+        return create_exports(analyzer, analysis_data, metadata_summary)
+    return _build_exports(analysis_key, analyzer, analysis_data, metadata_summary)
+
+
+@st.cache_data(show_spinner=False, ttl=600)
+def tesseract_version() -> Optional[str]:
+    """Probe the Tesseract binary at most every ten minutes instead of forking it on every rerun"""
+    try:
+        return str(pytesseract.get_tesseract_version())
+    except Exception:
+        # Return instead of raising so a missing install is cached too
+        return None
+
 
 def main():
     st.set_page_config(
@@ -796,6 +1148,8 @@ def main():
     st.markdown("📤 Upload medical PDFs to extract and display comprehensive metadata with AI-powered analysis")
     
     # Initialize analyzer
+    # Cheap to build each rerun: the HTTP session and other process-wide resources are cached
+    # separately, and a fresh instance always runs the current script's code
     analyzer = MedicalPDFAnalyzer()
     
     # Sidebar for configuration
@@ -803,10 +1157,10 @@ def main():
         st.header("⚙️ System Configuration")
         
         # Check Tesseract configuration
-        try:
-            version = pytesseract.get_tesseract_version()
+        version = tesseract_version()
+        if version:
             st.success(f"✅ Tesseract OCR: {version}")
-        except:
+        else:
             st.error("❌ Tesseract not found. Install Tesseract: https://github.com/UB-Mannheim/tesseract/wiki")
         
         # Check API configuration
@@ -819,12 +1173,15 @@ def main():
         st.subheader("Upload Settings")
         max_file_size = st.slider("Maximum file size (MB)", 1, 100, 50)
         enable_ocr = st.checkbox("Enable OCR for scanned PDFs", value=True)
+        ocr_dpi = st.slider("OCR DPI", 150, 400, DEFAULT_OCR_DPI, step=50)
         st.info("OCR is recommended for scanned documents but may increase processing time")
         
         st.divider()
         st.subheader("Analysis Settings")
         confidence_threshold = st.selectbox("Analysis confidence threshold", ["High", "Medium", "Low"], index=1)
         st.markdown("Select the confidence level for more reliable results")
+        processing_mode = st.radio("Processing mode", list(PROCESSING_MODES), index=0)
+        st.info("Conservative mode sends chunks one at a time to stay under OpenRouter rate limits on large documents")
         
         st.divider()
         st.subheader("About")
@@ -832,20 +1189,31 @@ def main():
         st.markdown("[Source Code](https://github.com/your-org/medical-pdf-analyzer)")
     
     # File uploader
-    st.header("📤 Upload Medical PDF")
-    uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"], accept_multiple_files=False)
+    st.header("📤 Upload Medical PDFs")
+    uploaded_files = st.file_uploader("Choose PDF files", type=["pdf"], accept_multiple_files=True)
+    
+    # Documents are analyzed one at a time; switching back to an earlier upload is served from the caches
+    uploaded_file = None
+    if len(uploaded_files) > 1:
+        uploaded_file = st.selectbox("Document to analyze", uploaded_files, format_func=lambda f: f.name)
+    elif uploaded_files:
+        uploaded_file = uploaded_files[0]
     
     if uploaded_file:
         # Validate file size
-        file_size_mb = len(uploaded_file.getvalue()) / (1024 * 1024)
+        file_size_mb = uploaded_file.size / (1024 * 1024)
         if file_size_mb > max_file_size:
             st.error(f"File size ({file_size_mb:.2f}MB) exceeds maximum limit of {max_file_size}MB")
         else:
             st.success(f"Uploaded: {uploaded_file.name} ({file_size_mb:.2f}MB)")
             
+            # Read the upload once; both the cache key and the PDF parsers use these bytes
+            pdf_bytes = uploaded_file.getvalue()
+            pdf_sha256 = upload_sha256(uploaded_file.file_id, pdf_bytes)
+            
             # Extract text
             with st.spinner("Extracting text from PDF..."):
-                text = analyzer.extract_text_from_pdf(uploaded_file)
+                text = extract_text_cached(analyzer, pdf_bytes, pdf_sha256, ocr_dpi, enable_ocr)
             
             if text:
                 st.success("Text extraction completed!")
@@ -855,12 +1223,12 @@ def main():
                 
                 # Analyze medical data
                 with st.spinner(f"Analyzing medical data with {confidence_threshold.lower()} confidence..."):
-                    analysis_data = analyzer.analyze_medical_data(text)
+                    analysis_data, analysis_key = analyze_medical_data_cached(analyzer, text, PROCESSING_MODES[processing_mode])
                 
                 if analysis_data:
                     st.success("Medical data analysis completed!")
                     # Display complete metadata
-                    analyzer.display_complete_metadata(analysis_data)
+                    analyzer.display_complete_metadata(analysis_data, analysis_key)
                 else:
                     st.error("Failed to analyze medical data. Please try another PDF or check API settings.")
             else: